@@ -1,12 +1,30 @@
+import functools
+import io
 import os
+import threading
+
+# Must be set before anything (gradio included) can pull in torch: with
+# CUDA >= 12.2 kernels are then loaded on first use instead of all at once.
+os.environ.setdefault("CUDA_MODULE_LOADING", "LAZY")
+
 import warnings
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple
 
+import anyio
 import gradio as gr
 from fastapi import FastAPI
 import importlib
 import logging
 
+# Suppress a noisy internal PyTorch / pyannote warning that's benign for short segments
+# (std(): degrees of freedom is <= 0). This spams logs but doesn't indicate a fatal error.
+# Registered once here; filterwarnings appends a new entry on every call.
+warnings.filterwarnings(
+    "ignore",
+    message=r"std\(\): degrees of freedom is <= 0",
+    category=UserWarning,
+)
+
 # Lightweight dependency import checker. This tries to import the requested
 # packages and returns a serializable status map. We avoid heavy initialization
 # (no model downloads) \u2014 this is only to surface missing packages / import errors
@@ -20,7 +38,7 @@ def check_dependencies() -> dict:
 
     Returns a dict of package -> {ok: bool, error: str | None}.
     """
-    pkgs = [("gradio", "gradio"), ("fastapi", "fastapi"), ("whisper", "whisper"), ("pyannote.audio", "pyannote.audio")]
+    pkgs = [("gradio", "gradio"), ("fastapi", "fastapi"), ("faster_whisper", "faster_whisper"), ("pyannote.audio", "pyannote.audio")]
     status = {}
     for name, mod in pkgs:
         try:
@@ -53,12 +71,58 @@ except Exception:
 
 # -----------------------------
 # 2) Lazy loaders (reduce startup RAM)
+#    Cached so each model is loaded once per process, not once per request.
 # -----------------------------
+def _locked(loader):
+    """Serialize calls to a cached loader so concurrent requests load a model once.
+
+    lru_cache doesn't hold a lock while the wrapped call runs, so two queue
+    workers missing the cache together would each load their own copy.
+    """
+    lock = threading.Lock()
+
+    @functools.wraps(loader)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return loader(*args, **kwargs)
+
+    def cache_clear():
+        with lock:
+            loader.cache_clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+def _torch_device():
+    import torch
+
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+@_locked
+@functools.lru_cache(maxsize=4)
 def _load_whisper(model_name: str = "base"):
-    import whisper
-    return whisper.load_model(model_name)
+    # faster-whisper runs on the CTranslate2 engine; INT8 weights cut memory
+    # traffic roughly 4x versus the stock PyTorch fp32 runtime.
+    # The batched pipeline packs VAD chunks into one forward pass.
+    import torch
+    from faster_whisper import WhisperModel, BatchedInferencePipeline
+
+    if torch.cuda.is_available():
+        device, compute_type = "cuda", "int8_float16"
+    else:
+        device, compute_type = "cpu", "int8"
+    model = WhisperModel(model_name, device=device, compute_type=compute_type, num_workers=1)
+    return BatchedInferencePipeline(model=model)
 
 
+@_locked
+@functools.lru_cache(maxsize=1)
 def _load_diarization_pipeline():
     # Requires a valid Hugging Face token with access to pyannote pipelines
     from pyannote.audio import Pipeline
@@ -68,18 +132,10 @@ def _load_diarization_pipeline():
         raise RuntimeError("No HUGGINGFACE_TOKEN found in environment. "
                             "Create a .enw with HUGGINGFACE_TOKEN=hf_xxx and pass it via --env-file .env")
 
-    # Suppress a noisy internal PyTorch / pyannote warning that's benign for short segments
-    # (std(): degrees of freedom is <= 0). This spams logs but doesn't indicate a fatal error.
-    warnings.filterwarnings(
-        "ignore",
-        message=r\std\(\): degrees of freedom is <= 0",
-        category=UserWarning,
-    )
-
     # Default (speaker diarization) pipeline; adjust to your subscription/model access
     # Example model: "pyannote/speaker-diarization-3.1". Wrap load in a friendly error message
     try:
-        return Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=token)
+        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=token)
     except Exception as exc:
         # Surface a clear runtime error for the UI/logs instead of a stack trace from deep inside HF libs.
         raise RuntimeError(
@@ -87,25 +143,59 @@ def _load_diarization_pipeline():
             "Ensure your HUGGINGFACE_TOKEN has the correct scopes and the model id is accessible. "
             f"Underlying error: {exc}"
         )
+    if pipeline is None:
+        # pyannote returns None (instead of raising) when the gated model isn't accessible
+        raise RuntimeError(
+            "Failed to load diarization pipeline from Hugging Face. "
+            "Ensure you accepted the pyannote/speaker-diarization-3.1 license for this token."
+        )
+
+    # Segmentation + embedding networks are far faster on an accelerator
+    pipeline.to(_torch_device())
+    return pipeline
 
 
 # -----------------------------
 # 3) Core logic
 # -----------------------------
-def _format_diarization(segments) -> str:
+def _format_diarization(starts, ends, speakers) -> str:
     """
-    segments: iterable of (start, end, speaker_label)
+    starts, ends, speakers: parallel sequences, one entry per speaker segment
     """
-    lines = []
-    for s, e, spk in segments:
-        lines.append(f"[{s:7.2f} \u2192 {e:7.2f}]  {spk}")
-    return "\n".join(lines) if lines else "(no speaker segments)"
+    buf = io.StringIO()
+    write = buf.write
+    for s, e, spk in zip(starts, ends, speakers):
+        write(f"[{s:7.2f} \u2192 {e:7.2f}]  {spk}\n")
+    out = buf.getvalue()
+    return out[:-1] if out else "(no speaker segments)"
+
+
+SAMPLE_RATE = 16000  # what both Whisper and pyannote expect
+
+
+def _load_audio(audio_path: str):
+    """Decode an audio file once into a mono (1, time) 16 kHz CPU tensor.
+
+    The same buffer feeds Whisper and pyannote, so the file is only read,
+    decoded and resampled a single time. It stays on the CPU (Whisper wants a
+    numpy array); only the diarization branch moves it to the device.
+    """
+    import torchaudio
+
+    waveform, sr = torchaudio.load(audio_path)
+    if waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+    if sr != SAMPLE_RATE:
+        waveform = torchaudio.functional.resample(waveform, sr, SAMPLE_RATE)
+        sr = SAMPLE_RATE
+    return waveform, sr
 
 
 def transcribe_and_diarize(
     audio_path: str,
     whisper_model: str,
-    enable_diarization: bool
+    enable_diarization: bool,
+    batch_size: int = 16,
 ) -> Tuple[str, str, str]:
     """
     Returns:
@@ -118,10 +208,17 @@ def transcribe_and_diarize(
 
     # --- Transcribe ---
     try:
-        model = _load_whisper(whisper_model)
-        # 'openai-whisper' expects path; set fp16 to False on CPU
-        result = model.transcribe(audio_path, fp16=False)
-        text = (result or {}).get("text", "").strip()
+        waveform, sr = _load_audio(audio_path)
+        batched = _load_whisper(whisper_model)
+        # The batched pipeline already splits long audio at VAD silences and
+        # decodes those chunks in batches, so every length takes this path.
+        # faster-whisper returns a lazy generator; materialize it once so the
+        # segments can feed both the transcript and the diarization merge.
+        segments_iter, _info = batched.transcribe(
+            waveform.squeeze(0).numpy(), batch_size=int(batch_size), beam_size=5, vad_filter=True
+        )
+        whisper_segs = [{"start": s.start, "end": s.end, "text": s.text} for s in segments_iter]
+        text = " ".join(s["text"].strip() for s in whisper_segs).strip()
     except Exception as exc:
         text = f"\u274c Transcription error: {exc}"
         return text, "", ""
@@ -132,32 +229,29 @@ def transcribe_and_diarize(
     if enable_diarization:
         try:
             pipeline = _load_diarization_pipeline()
-            diar = pipeline(audio_path)
+            # Reuse the decoded tensor rather than the path; only this branch needs it on the device
+            diar = pipeline({"waveform": waveform.to(_torch_device()), "sample_rate": sr})
+
+            # Collect speaker-labeled segments once, as parallel lists shared by
+            # the diarization output and the merger
+            starts: List[float] = []
+            ends: List[float] = []
+            speakers: List[str] = []
 
-            # Collect speaker-labeled segments for diarization output
-            segs: List[Tuple[float, float, str]] = []
-            # Also collect in format for merger
-            diar_segs: List[Dict[str, Any]] = []
-            
             # diar is an Annotation; iterate over segments and labels
             for (start, end), _, label in diar.itertracks(yield_label=True):
-                start_t, end_t = float(start), float(end)
-                speaker = str(label)
-                segs.append((start_t, end_t, speaker))
-                diar_segs.append({"start": start_t, "end": end_t, "speaker": speaker})
+                starts.append(float(start))
+                ends.append(float(end))
+                speakers.append(str(label))
 
-            diar_text = _format_diarization(segs)
+            diar_text = _format_diarization(starts, ends, speakers)
 
             # Merge transcript with diarization using our merge script
-            from scripts.merge_transcript_diarization import merge_segments, format_text
-            
-            # Convert whisper result to segments
-            whisper_segs = [{"start": s["start"], "end": s["end"], "text": s["text"]} 
-                          for s in result.get("segments", [])]
-            
+            from scripts.merge_transcript_diarization import merge_segment_arrays, format_text
+
             if whisper_segs:
                 # Merge and format as text
-                merged = merge_segments(whisper_segs, diar_segs)
+                merged = merge_segment_arrays(whisper_segs, starts, ends, speakers)
                 combined_text = format_text(merged)
             else:
                 combined_text = "(no transcript segments to merge)"
@@ -172,6 +266,11 @@ def transcribe_and_diarize(
     return text or "(empty transcript)", diar_text, combined_text
 
 
+async def transcribe_and_diarize_async(*args) -> Tuple[str, str, str]:
+    """Run the blocking transcription on a worker thread so the event loop stays free."""
+    return await anyio.to_thread.run_sync(transcribe_and_diarize, *args)
+
+
 # -----------------------------
 # 4) UI (Gradio Blocks)
 # -----------------------------
@@ -187,6 +286,7 @@ with gr.Blocks(title="Transcribe + Diarize", css="footer {visibility: hidden}")
             value="base"
         )
         diar_ck = gr.Checkbox(label="Enable diarization (requires HUGGINGFACE_TOKEN)", value=False)
+        batch_sl = gr.Slider(label="Batch size", minimum=1, maximum=32, step=1, value=16)
 
     go = gr.Button("Transcribe")
 
@@ -198,12 +298,15 @@ with gr.Blocks(title="Transcribe + Diarize", css="footer {visibility: hidden}")
 
     # IMPORTANT: pass components (not values) to inputs/outputs
     go.click(
-        fn=transcribe_and_diarize,
-        inputs=[audio_input, model_dd, diar_ck],
+        fn=transcribe_and_diarize_async,
+        inputs=[audio_input, model_dd, diar_ck, batch_sl],
         outputs=[out_text, out_diar, out_combined],
-        api_name=None
+        api_name=None,
     )
 
+# Let a couple of requests run at once; each holds a worker thread, not the event loop
+demo.queue(default_concurrency_limit=2, max_size=32)
+
 # -----------------------------
 # 5) FastAPI app + mount Gradio
 #    Works with: uvicorn app:app --host 0.0.0.0 --port 7860
@@ -212,28 +315,49 @@ _fastapi = FastAPI()
 
 
 @_fastapi.get("/health")
-def _health():
+def _health(fresh: bool = False):
     """Health endpoint that reports import status for key dependencies.
 
     This is intentionally lightweight (no model loading) and is useful for
-    CI / container health checks.
+    CI / container health checks. The status is computed once at startup;
+    pass `?fresh=1` to re-run the import checks.
     """
-    deps = check_dependencies()
+    deps = check_dependencies() if fresh else _DEPS_STATUS
     overall = all(info["ok"] for info in deps.values())
     return {"ok": overall, "dependencies": deps}
 
 
+@_fastapi.post("/reload")
+def _reload():
+    """Drop cached models so the next request loads them fresh."""
+    _load_whisper.cache_clear()
+    _load_diarization_pipeline.cache_clear()
+    return {"ok": True}
+
+
 # Log dependency status at startup so it's visible in container logs.
-deps_status = check_dependencies()
-for pkg, info in deps_status.items():
+_DEPS_STATUS = check_dependencies()
+for pkg, info in _DEPS_STATUS.items():
     if info["ok"]:
         logger.info(f"Dependency OK: {pkg}")
     else:
         logger.warning(f"Dependency MISSING/FAILED: {pkg} -> {info['error']}")
 
+# Optionally pre-warm a Whisper model (e.g. PRELOAD_MODEL=base) so the first
+# request doesn't pay the model load.
+_preload = os.getenv("PRELOAD_MODEL", "").strip()
+if _preload:
+    try:
+        _load_whisper(_preload)
+        logger.info(f"Preloaded Whisper model: {_preload}")
+    except Exception as exc:
+        logger.warning(f"Could not preload Whisper model {_preload}: {exc}")
+
 app = gr.mount_gradio_app(_fastapi, demo, path="/")
 
-# If you prefer running `python app.py` locally instead of uvicorn:
+# If you prefer running `python app.py` locally instead of the uvicorn CLI:
 if __name__ == "__main__":
     # Note: inside Docker we use uvicorn via CMD; this path is for local dev.
-    demo.launch(server_name="0.0.0.0", server_port=7860, show_api=False)
\ No newline at end of file
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=7860, loop="uvloop", http="httptools", workers=1)
@@ -0,0 +1,121 @@
+"""The speaker-assignment paths in merge_transcript_diarization must agree with
+the original pairwise loop, including how they break ties between
+equally-overlapping speakers."""
+import random
+
+import pytest
+
+from scripts import merge_transcript_diarization as merge
+
+
+def _random_case(rng: random.Random, integer_times: bool):
+    snap = (lambda x: float(round(x))) if integer_times else (lambda x: x)
+    w_starts, w_ends = [], []
+    for _ in range(rng.randint(1, 40)):
+        s = snap(rng.uniform(0, 100))
+        w_starts.append(s)
+        w_ends.append(s + snap(rng.uniform(0, 8)))
+    d_starts, d_ends, d_speakers = [], [], []
+    # Unsorted, overlapping diarization segments
+    for _ in range(rng.randint(1, 40)):
+        s = snap(rng.uniform(0, 100))
+        d_starts.append(s)
+        d_ends.append(s + snap(rng.uniform(0, 10)))
+        d_speakers.append(rng.choice(["A", "B", "C", "SPEAKER_00"]))
+    return w_starts, w_ends, d_starts, d_ends, d_speakers
+
+
+def _reference(w_starts, w_ends, d_starts, d_ends, d_speakers):
+    """The original O(W*D) loop: every pair, input order, first maximum wins."""
+    speakers = []
+    for ws, we in zip(w_starts, w_ends):
+        per_speaker = {}
+        for s, e, spk in zip(d_starts, d_ends, d_speakers):
+            ov = max(0.0, min(we, e) - max(ws, s))
+            if ov > 0:
+                per_speaker[spk] = per_speaker.get(spk, 0.0) + ov
+        speakers.append(max(per_speaker.items(), key=lambda kv: kv[1])[0] if per_speaker else "(Unknown)")
+    return speakers
+
+
+def _cases():
+    rng = random.Random(0)
+    return [_random_case(rng, integer_times=i % 2 == 0) for i in range(300)]
+
+
+def test_sweep_matches_reference():
+    for case in _cases():
+        assert merge._assign_speakers_sweep(*case) == _reference(*case)
+
+
+def _long_segment_case():
+    # One segment spanning the whole file must not widen every other window
+    w_starts = [i * 1.5 for i in range(400)]
+    w_ends = [s + 1.5 for s in w_starts]
+    d_starts = [0.0] + [i * 2.0 for i in range(300)]
+    d_ends = [600.0] + [s + 1.9 for s in d_starts[1:]]
+    d_speakers = ["LONG"] + ["AB"[i % 2] for i in range(300)]
+    return w_starts, w_ends, d_starts, d_ends, d_speakers
+
+
+def test_sweep_with_long_segment():
+    case = _long_segment_case()
+    assert merge._assign_speakers_sweep(*case) == _reference(*case)
+
+    order, starts, buckets = merge._bucket_by_duration(case[2], case[3])
+    assert [end - begin for _, begin, end in buckets] == [300, 1]  # the long one sits alone
+
+
+def test_numba_matches_reference():
+    pytest.importorskip("numba")
+    for case in _cases():
+        assert merge._assign_speakers_numba(*case) == _reference(*case)
+
+
+def test_numba_with_long_segment():
+    pytest.importorskip("numba")
+    case = _long_segment_case()
+    assert merge._assign_speakers_numba(*case) == _reference(*case)
+
+
+def test_tie_goes_to_first_overlapping_segment():
+    # Both speakers fully cover the whisper segment; "B" is listed first
+    case = ([1.0], [2.0], [0.0, 0.0], [5.0, 5.0], ["B", "A"])
+    assert merge._assign_speakers_sweep(*case) == ["B"]
+    if merge._compiled_kernel() is not None:
+        assert merge._assign_speakers_numba(*case) == ["B"]
+
+
+def test_merge_segments_without_overlap_is_unknown():
+    merged = merge.merge_segments(
+        [{"start": 10.0, "end": 11.0, "text": " hi "}],
+        [{"start": 0.0, "end": 1.0, "speaker": "A"}],
+    )
+    assert merged == [{"start": 10.0, "end": 11.0, "speaker": "(Unknown)", "text": "hi"}]
+
+
+def test_srt_file_matches_format_srt(tmp_path):
+    whisper = tmp_path / "whisper.json"
+    whisper.write_text('{"segments": [{"start": 0.0, "end": 1.0, "text": " hi "},'
+                       ' {"start": 1.0, "end": 2.0, "text": " there "}]}', encoding="utf-8")
+    diar = tmp_path / "diar.json"
+    diar.write_text('[{"start": 0.0, "end": 2.0, "speaker": "A"}]', encoding="utf-8")
+    out = tmp_path / "out.srt"
+
+    assert merge.main(["--whisper", str(whisper), "--diarization", str(diar),
+                       "--format", "srt", "--out", str(out)]) == 0
+    merged = merge.merge_segments(merge.load_whisper_segments(str(whisper)),
+                                  merge.load_diarization_segments(str(diar)))
+    written = out.read_text(encoding="utf-8")
+    assert written == merge.format_srt(merged)
+    assert written.endswith("there\n") and not written.endswith("\n\n")
+
+
+def test_load_diarization_text_with_crlf(tmp_path):
+    dump = tmp_path / "diar.txt"
+    dump.write_bytes("[  0.00 →   2.50]  A\r\n".encode("utf-8"))
+    assert merge.load_diarization_segments(str(dump)) == [{"start": 0.0, "end": 2.5, "speaker": "A"}]
+
+
+def test_srt_time_rounds_into_the_next_second():
+    assert merge._to_srt_time(1.9996) == "00:00:02,000"